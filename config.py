@@ -1,4 +1,5 @@
-from pydantic_settings import BaseSettings
+from functools import lru_cache
+from pydantic_settings import BaseSettings, SettingsConfigDict
 from typing import Optional
 
 class Settings(BaseSettings):
@@ -7,6 +8,10 @@ class Settings(BaseSettings):
     # Database settings
     turso_database_url: str
     turso_auth_token: str
+    turso_max_concurrency: int = 20
+    # Streamed exports are paced by the client, so they get their own smaller
+    # cap instead of holding query slots for the whole download
+    turso_max_streams: int = 4
     
     # API settings
     api_title: str = "Steam External Backend API"
@@ -18,16 +23,21 @@ class Settings(BaseSettings):
     port: int = 8000
     debug: bool = False
     
-    # CORS settings
+    # CORS settings - the API is public and cookie-less, so any origin may read it
+    # without credentials; set CORS_ORIGINS to a JSON list to restrict it
     cors_origins: list[str] = ["*"]
-    cors_allow_credentials: bool = True
-    cors_allow_methods: list[str] = ["*"]
+    cors_allow_credentials: bool = False
+    cors_allow_methods: list[str] = ["GET"]
     cors_allow_headers: list[str] = ["*"]
     
-    class Config:
-        env_file = ".env"
-        env_file_encoding = "utf-8"
-        case_sensitive = False
+    model_config = SettingsConfigDict(
+        env_file=".env",
+        env_file_encoding="utf-8",
+        case_sensitive=False,
+        frozen=True
+    )
 
-# Create global settings instance
-settings = Settings()
\ No newline at end of file
+@lru_cache(maxsize=1)
+def get_settings() -> Settings:
+    """Build the settings on first use and share the instance afterwards"""
+    return Settings()
\ No newline at end of file
@@ -1,38 +1,193 @@
-import os
 import asyncio
+import collections
+import contextlib
+import functools
+import heapq
+import logging
+import operator
 import httpx
-import json
-from typing import List, Dict, Optional, Any
-from dotenv import load_dotenv
+import ijson
+import orjson
+from async_lru import alru_cache
+from typing import List, Dict, Optional, Any, AsyncIterator
+from config import get_settings
+from models import FileRow
 
-load_dotenv()
+logger = logging.getLogger(__name__)
+
+# Turso expires idle Hrana streams after ~10s; only reuse batons younger than this
+BATON_MAX_IDLE_SECONDS = 5.0
+
+# In-process read caches: single-row lookups are cached per key, the full app
+# list is kept as a short snapshot so bursts collapse into one backend query
+APP_CACHE_SIZE = 10_000
+FILE_CACHE_SIZE = 256  # entries hold full file content, keep this small
+FILE_LIST_CACHE_SIZE = 2048
+LOOKUP_CACHE_TTL_SECONDS = 60
+APPS_SNAPSHOT_TTL_SECONDS = 2.0
+VERSION_CACHE_TTL_SECONDS = 1.0
+
+# Max bound parameters per IN (...) list; larger lookups are split across
+# statements in the same pipeline request
+MAX_IN_PARAMS = 500
+
+# Per-type file tables, keyed by the file_type exposed through the API
+FILE_TABLES = {
+    'json': 'json_files',
+    'lua': 'lua_files',
+    'manifest': 'manifest_files',
+    'vdf': 'vdf_files'
+}
+
+# Turso v2 argument encoders keyed by exact Python type; anything else is sent as text
+NULL_PARAM = {"type": "null", "value": None}
+
+def _encode_text_param(value: Any) -> Dict[str, Any]:
+    return {"type": "text", "value": str(value)}
+
+PARAM_ENCODERS = {
+    str: lambda value: {"type": "text", "value": value},
+    int: lambda value: {"type": "integer", "value": str(value)},
+    float: lambda value: {"type": "real", "value": str(value)},
+    bool: lambda value: {"type": "integer", "value": "1" if value else "0"}
+}
+
+@functools.lru_cache(maxsize=4)
+def _build_api_url(url: str) -> str:
+    """Turn a Turso database URL (libsql:// or https://) into its v2 pipeline endpoint"""
+    if url.startswith("libsql://"):
+        url = url.replace("libsql://", "https://", 1)
+    return url.rstrip('/') + "/v2/pipeline"
+
+# Column layouts of the row shapes returned by DatabaseManager queries
+APP_COLUMNS = ("app_id", "created_at", "updated_at", "name", "type")
+FILE_COLUMNS = ("id", "app_id", "filename", "size", "uploaded_at")
+FILE_CONTENT_COLUMNS = ("id", "app_id", "filename", "content", "size", "uploaded_at")
+
+# Hrana v2 always returns cells as {"type": ..., "value": ...} objects (null
+# cells omit "value"), so unwrapping is a C-level dict.get per cell
+_cell_value = operator.methodcaller("get", "value")
+
+def _extract_value(turso_value):
+    """Extract value from Turso v2 API response format"""
+    return _cell_value(turso_value) if type(turso_value) is dict else turso_value
+
+def _rows_to_dicts(columns: tuple, rows: List[List[Any]]) -> List[Dict]:
+    """Convert Turso v2 rows to dicts keyed by columns, unwrapping typed cells"""
+    return [dict(zip(columns, map(_cell_value, row))) for row in rows]
+
+def _rows_to_file_rows(columns: tuple, rows: List[List[Any]]) -> List[FileRow]:
+    """Convert Turso v2 file rows to FileRow objects keyed by columns"""
+    return [FileRow(**dict(zip(columns, map(_cell_value, row)))) for row in rows]
+
+class _AsyncByteReader:
+    """Minimal async file-like wrapper so ijson can read an httpx byte stream"""
+    
+    def __init__(self, chunks: AsyncIterator[bytes]):
+        self._chunks = chunks.__aiter__()
+    
+    async def read(self, size: int = -1) -> bytes:
+        # ijson probes with read(0) to detect bytes vs str; don't consume a chunk
+        if size == 0:
+            return b""
+        try:
+            return await self._chunks.__anext__()
+        except StopAsyncIteration:
+            return b""
+
+# ijson prefixes of the values _stream_rows pulls out of a pipeline response
+STREAM_ROW_PREFIX = "results.item.response.result.rows.item"
+STREAM_ERROR_PREFIX = "results.item.error"
+
+async def _build_json_value(events: AsyncIterator[tuple], event: str, value: Any) -> Any:
+    """Assemble the JSON value starting at (event, value) from the rest of an ijson event stream"""
+    builder = ijson.ObjectBuilder()
+    depth = 0
+    while True:
+        builder.event(event, value)
+        if event in ("start_map", "start_array"):
+            depth += 1
+        elif event in ("end_map", "end_array"):
+            depth -= 1
+        if not depth:
+            return builder.value
+        _, event, value = await anext(events)
 
 class DatabaseManager:
     def __init__(self):
-        self.database_url = os.getenv("TURSO_DATABASE_URL")
-        self.auth_token = os.getenv("TURSO_AUTH_TOKEN")
+        settings = get_settings()
+        self.database_url = settings.turso_database_url
+        self.auth_token = settings.turso_auth_token
+        self.max_concurrency = settings.turso_max_concurrency
+        self.max_streams = settings.turso_max_streams
         
         if not self.database_url or not self.auth_token:
             raise ValueError("TURSO_DATABASE_URL and TURSO_AUTH_TOKEN must be set in environment variables")
         
-        # Convert libsql:// to https:// for HTTP API
-        if self.database_url.startswith("libsql://"):
-            self.api_url = self.database_url.replace("libsql://", "https://") + "/v2/pipeline"
-        else:
-            self.api_url = self.database_url.rstrip('/') + "/v2/pipeline"
+        self.api_url = _build_api_url(self.database_url)
+        
+        # Constant for the lifetime of the manager; sent as client-level defaults
+        self._default_headers = {
+            "Authorization": f"Bearer {self.auth_token}",
+            "Content-Type": "application/json"
+        }
+        
+        # Shared HTTP client, created in initialize() and closed in close()
+        self._http: Optional[httpx.AsyncClient] = None
+        
+        # Caps in-flight Turso requests so request bursts can't exceed plan limits
+        self._sem: Optional[asyncio.Semaphore] = None
+        # Separate cap for client-paced _stream_rows responses so slow
+        # downloads can't starve regular queries (and /health) of slots
+        self._stream_sem: Optional[asyncio.Semaphore] = None
+        
+        # Recent pipeline round-trip times and streamed response durations in
+        # seconds, plus requests currently holding either semaphore, for pool_stats()
+        self._latencies = collections.deque(maxlen=1000)
+        self._stream_durations = collections.deque(maxlen=1000)
+        self._in_flight = 0
+        
+        # Idle Hrana stream batons as (baton, base_url, last_used) so sessions
+        # stay warm between queries instead of being torn down every time
+        self._batons: List[tuple] = []
+        
+        # (version, limit, after) -> (expires_at, apps) snapshots for get_all_apps,
+        # plus the fetch currently refreshing each key so concurrent callers of
+        # one page share a query without blocking other pages
+        self._apps_snapshots: Dict[tuple, tuple] = {}
+        self._apps_fetches: Dict[tuple, asyncio.Task] = {}
+        
+        # key -> (expires_at, version) for get_apps_version/get_files_version
+        self._versions: Dict[Any, tuple] = {}
     
     async def initialize(self):
         """Initialize the database connection and create tables"""
         try:
-            # Test connection
-            await self.test_connection()
+            # Reuse one pooled HTTP/2 client for every query instead of
+            # paying DNS + TLS setup per request
+            self._http = httpx.AsyncClient(
+                http2=True,
+                timeout=30.0,
+                limits=httpx.Limits(
+                    max_connections=self.max_concurrency + self.max_streams,
+                    max_keepalive_connections=self.max_concurrency,
+                    keepalive_expiry=30.0
+                ),
+                headers=self._default_headers
+            )
+            self._sem = asyncio.Semaphore(self.max_concurrency)
+            self._stream_sem = asyncio.Semaphore(self.max_streams)
             
-            # Create tables if they don't exist
-            await self._create_tables()
-            print("Database initialized successfully")
+            # Test the connection and create tables in a single round trip
+            statements = ["SELECT 1 as test"] + self._table_schemas()
+            results = await self._pipeline([
+                {"type": "execute", "stmt": {"sql": sql}} for sql in statements
+            ])
+            self._check_results(results)
+            logger.info("Database initialized successfully")
             
         except Exception as e:
-            print(f"Failed to initialize database: {e}")
+            logger.error("Failed to initialize database: %s", e)
             raise
     
     def _format_turso_params(self, params: Optional[List]) -> List[Dict[str, Any]]:
@@ -40,67 +195,114 @@ class DatabaseManager:
         if not params:
             return []
         
-        formatted_params = []
-        for param in params:
-            if param is None:
-                formatted_params.append({"type": "null", "value": None})
-            elif isinstance(param, str):
-                formatted_params.append({"type": "text", "value": param})
-            elif isinstance(param, int):
-                formatted_params.append({"type": "integer", "value": str(param)})
-            elif isinstance(param, float):
-                formatted_params.append({"type": "real", "value": str(param)})
-            else:
-                # Default to text for other types
-                formatted_params.append({"type": "text", "value": str(param)})
-        
-        return formatted_params
+        return [
+            NULL_PARAM if param is None
+            else PARAM_ENCODERS.get(type(param), _encode_text_param)(param)
+            for param in params
+        ]
+    
+    def _checkout_baton(self) -> tuple:
+        """Take the most recently used idle stream, or (None, None) for a new one"""
+        now = asyncio.get_running_loop().time()
+        while self._batons:
+            baton, base_url, last_used = self._batons.pop()
+            if now - last_used < BATON_MAX_IDLE_SECONDS:
+                return baton, base_url
+        return None, None
+    
+    @contextlib.asynccontextmanager
+    async def _slot(self, sem: asyncio.Semaphore, durations: collections.deque):
+        """Hold a slot of sem, counting it as in flight and recording how long it was held"""
+        async with sem:
+            self._in_flight += 1
+            started = asyncio.get_running_loop().time()
+            try:
+                yield
+            finally:
+                self._in_flight -= 1
+                durations.append(asyncio.get_running_loop().time() - started)
+    
+    async def _pipeline(self, requests: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Send a Hrana v2 pipeline request, reusing an open stream when possible"""
+        baton, base_url = self._checkout_baton()
+        
+        payload = {"baton": baton, "requests": requests}
+        url = _build_api_url(base_url) if base_url else self.api_url
+        
+        async with self._slot(self._sem, self._latencies):
+            response = await self._http.post(url, content=orjson.dumps(payload))
+            
+            if response.status_code != 200 and baton is not None:
+                # The stream most likely expired on the server; retry on a fresh one
+                payload["baton"] = None
+                response = await self._http.post(self.api_url, content=orjson.dumps(payload))
+        
+        if response.status_code != 200:
+            raise Exception(f"Database query failed: {response.status_code} - {response.text}")
+        
+        result = orjson.loads(response.content)
+        
+        if result.get("baton"):
+            self._batons.append((
+                result["baton"],
+                result.get("base_url"),
+                asyncio.get_running_loop().time()
+            ))
+        
+        return result.get("results", [])
+    
+    def _check_results(self, results: List[Dict[str, Any]]):
+        """Raise on the first failed statement in a pipeline response"""
+        for result in results:
+            if result.get("type") == "error":
+                raise Exception(f"Database query error: {result.get('error', 'Unknown error')}")
+    
+    def pool_stats(self) -> Dict[str, Any]:
+        """Snapshot of connection usage, recent query latency and stream durations"""
+        def percentiles_ms(samples: collections.deque) -> Dict[str, Optional[float]]:
+            ordered = sorted(samples)
+            
+            def percentile(p: float) -> Optional[float]:
+                if not ordered:
+                    return None
+                index = min(len(ordered) - 1, int(p / 100 * len(ordered)))
+                return round(ordered[index] * 1000, 2)
+            
+            return {"p50": percentile(50), "p95": percentile(95), "p99": percentile(99)}
+        
+        return {
+            "max_concurrency": self.max_concurrency,
+            "max_streams": self.max_streams,
+            "in_flight": self._in_flight,
+            "idle_streams": len(self._batons),
+            "samples": len(self._latencies),
+            "latency_ms": percentiles_ms(self._latencies),
+            "stream_samples": len(self._stream_durations),
+            # Streams are paced by the client, so these are kept apart from query latency
+            "stream_duration_ms": percentiles_ms(self._stream_durations)
+        }
     
     async def _execute_query(self, query: str, params: Optional[List] = None) -> Dict[str, Any]:
         """Execute a query using Turso HTTP API v2"""
-        headers = {
-            "Authorization": f"Bearer {self.auth_token}",
-            "Content-Type": "application/json"
-        }
-        
         # Build the statement object
         stmt = {"sql": query}
         if params:
             stmt["args"] = self._format_turso_params(params)
         
-        # Build the payload with proper v2 structure
-        payload = {
-            "requests": [
-                {"type": "execute", "stmt": stmt},
-                {"type": "close"}
-            ]
-        }
+        results = await self._pipeline([{"type": "execute", "stmt": stmt}])
         
-        async with httpx.AsyncClient() as client:
-            response = await client.post(
-                self.api_url,
-                headers=headers,
-                json=payload,
-                timeout=30.0
-            )
-            
-            if response.status_code != 200:
-                raise Exception(f"Database query failed: {response.status_code} - {response.text}")
-            
-            result = response.json()
-            
-            # Extract the actual result from the v2 response structure
-            if "results" in result and len(result["results"]) > 0:
-                first_result = result["results"][0]
-                if first_result.get("type") == "ok" and "response" in first_result:
-                    return first_result["response"].get("result", {})
-                elif first_result.get("type") == "error":
-                    raise Exception(f"Database query error: {first_result.get('error', 'Unknown error')}")
-            
-            return result
+        # Extract the actual result from the v2 response structure
+        if len(results) > 0:
+            first_result = results[0]
+            if first_result.get("type") == "ok" and "response" in first_result:
+                return first_result["response"].get("result", {})
+            elif first_result.get("type") == "error":
+                raise Exception(f"Database query error: {first_result.get('error', 'Unknown error')}")
+        
+        return {}
     
-    async def _create_tables(self):
-        """Create necessary tables"""
+    def _table_schemas(self) -> List[str]:
+        """CREATE TABLE statements for the tables this service owns"""
         create_users_table = """
         CREATE TABLE IF NOT EXISTS users (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -112,172 +314,311 @@ class DatabaseManager:
         )
         """
         
-        await self._execute_query(create_users_table)
+        return [create_users_table]
     
     async def test_connection(self):
         """Test database connection"""
         result = await self._execute_query("SELECT 1 as test")
         return result
     
-    async def get_all_apps(self) -> List[Dict]:
-        """Get all apps"""
-        query = "SELECT * FROM apps ORDER BY created_at DESC"
-        
-        result = await self._execute_query(query)
-        
-        # Convert rows to dictionaries
-        apps = []
-        if "rows" in result:
-            for row in result["rows"]:
-                # Extract values from Turso v2 format
-                app = {
-                    "app_id": self._extract_value(row[0]),
-                    "created_at": self._extract_value(row[1]),
-                    "updated_at": self._extract_value(row[2]),
-                    "name": self._extract_value(row[3]),
-                    "type": self._extract_value(row[4])
-                }
-                apps.append(app)
+    async def get_all_apps(
+        self, limit: int = 100, after: Optional[tuple] = None, version: Optional[tuple] = None
+    ) -> List[Dict]:
+        """Get one page of apps, newest first.
+        
+        Pages are keyed by (created_at, app_id) so apps sharing a created_at are
+        never skipped: pass that pair from the last app of the previous page as
+        `after` to fetch the next one. Pages are served from a short-lived
+        snapshot shared by concurrent callers; pass the token from
+        get_apps_version as version so a snapshot is never served for a changed
+        app list.
+        """
+        key = (version, limit, after)
+        snapshot = self._apps_snapshots.get(key)
+        if snapshot is not None and asyncio.get_running_loop().time() < snapshot[0]:
+            return snapshot[1]
         
+        fetch = self._apps_fetches.get(key)
+        if fetch is None:
+            fetch = asyncio.ensure_future(self._fetch_apps_page(key, limit, after))
+            self._apps_fetches[key] = fetch
+            fetch.add_done_callback(lambda _: self._apps_fetches.pop(key, None))
+        # Shielded so one cancelled caller doesn't abort the fetch for the others
+        return await asyncio.shield(fetch)
+    
+    async def _fetch_apps_page(self, key: tuple, limit: int, after: Optional[tuple]) -> List[Dict]:
+        """Query one page of apps and store it as the snapshot for key"""
+        query = f"SELECT {', '.join(APP_COLUMNS)} FROM apps"
+        params = []
+        if after is not None:
+            query += " WHERE (created_at, app_id) < (?, ?)"
+            params.extend(after)
+        query += " ORDER BY created_at DESC, app_id DESC LIMIT ?"
+        params.append(limit)
+        
+        result = await self._execute_query(query, params)
+        
+        apps = _rows_to_dicts(APP_COLUMNS, result.get("rows", ()))
+        now = asyncio.get_running_loop().time()
+        self._apps_snapshots = {
+            k: v for k, v in self._apps_snapshots.items() if now < v[0]
+        }
+        self._apps_snapshots[key] = (now + APPS_SNAPSHOT_TTL_SECONDS, apps)
         return apps
     
+    def _cached_version(self, key: Any) -> Optional[tuple]:
+        """Return a still-fresh cached version token for key, if any"""
+        cached = self._versions.get(key)
+        if cached is not None and asyncio.get_running_loop().time() < cached[0]:
+            return cached[1]
+        return None
+    
+    def _store_version(self, key: Any, version: tuple):
+        """Cache a version token briefly so request bursts share one query"""
+        now = asyncio.get_running_loop().time()
+        self._versions = {k: v for k, v in self._versions.items() if now < v[0]}
+        self._versions[key] = (now + VERSION_CACHE_TTL_SECONDS, version)
+    
+    async def get_apps_version(self) -> tuple:
+        """(MAX(updated_at), COUNT(*)) over apps - changes whenever the app list does"""
+        version = self._cached_version("apps")
+        if version is None:
+            result = await self._execute_query("SELECT MAX(updated_at), COUNT(*) FROM apps")
+            version = tuple(map(_cell_value, result["rows"][0]))
+            self._store_version("apps", version)
+        return version
+    
+    async def get_files_version(self, app_id: str) -> tuple:
+        """(MAX(uploaded_at), COUNT(*)) over every file table for app_id"""
+        key = ("files", app_id)
+        version = self._cached_version(key)
+        if version is None:
+            args = self._format_turso_params([app_id])
+            results = await self._pipeline([
+                {
+                    "type": "execute",
+                    "stmt": {
+                        "sql": f"SELECT MAX(uploaded_at), COUNT(*) FROM {table_name} WHERE app_id = ?",
+                        "args": args
+                    }
+                }
+                for table_name in FILE_TABLES.values()
+            ])
+            self._check_results(results)
+            
+            latest, count = None, 0
+            for result in results:
+                table_latest, table_count = map(_cell_value, result["response"]["result"]["rows"][0])
+                if table_latest is not None and (latest is None or table_latest > latest):
+                    latest = table_latest
+                count += int(table_count)
+            
+            version = (latest, count)
+            self._store_version(key, version)
+        return version
+    
+    @alru_cache(maxsize=APP_CACHE_SIZE, ttl=LOOKUP_CACHE_TTL_SECONDS)
     async def get_app_by_id(self, app_id: str) -> Optional[Dict]:
         """Get an app by app_id"""
-        query = "SELECT * FROM apps WHERE app_id = ?"
+        query = f"SELECT {', '.join(APP_COLUMNS)} FROM apps WHERE app_id = ?"
         
         result = await self._execute_query(query, [app_id])
         
         if not result.get("rows") or len(result["rows"]) == 0:
             return None
         
-        row = result["rows"][0]
-        return {
-            "app_id": self._extract_value(row[0]),
-            "created_at": self._extract_value(row[1]),
-            "updated_at": self._extract_value(row[2]),
-            "name": self._extract_value(row[3]),
-            "type": self._extract_value(row[4])
-        }
+        return _rows_to_dicts(APP_COLUMNS, result["rows"][:1])[0]
+    
+    async def get_apps_by_ids(self, app_ids: List[str]) -> List[Dict]:
+        """Get several apps in one round trip, in the order of app_ids.
+        
+        Unknown app_ids are skipped. Use this instead of calling get_app_by_id
+        once per app.
+        """
+        unique_ids = list(dict.fromkeys(app_ids))
+        if not unique_ids:
+            return []
+        
+        requests = []
+        for start in range(0, len(unique_ids), MAX_IN_PARAMS):
+            chunk = unique_ids[start:start + MAX_IN_PARAMS]
+            placeholders = ",".join("?" * len(chunk))
+            requests.append({
+                "type": "execute",
+                "stmt": {
+                    "sql": f"SELECT {', '.join(APP_COLUMNS)} FROM apps WHERE app_id IN ({placeholders})",
+                    "args": self._format_turso_params(chunk)
+                }
+            })
+        
+        results = await self._pipeline(requests)
+        self._check_results(results)
+        
+        apps_by_id = {}
+        for result in results:
+            for app in _rows_to_dicts(APP_COLUMNS, result["response"].get("result", {}).get("rows", [])):
+                apps_by_id[app["app_id"]] = app
+        
+        return [apps_by_id[app_id] for app_id in unique_ids if app_id in apps_by_id]
     
-    def _extract_value(self, turso_value):
-        """Extract value from Turso v2 API response format"""
-        if isinstance(turso_value, dict) and "value" in turso_value:
-            return turso_value["value"]
-        return turso_value
+    def _file_table_requests(self, columns: tuple, app_id: str) -> List[Dict[str, Any]]:
+        """Build one execute request per file table selecting columns for app_id"""
+        args = self._format_turso_params([app_id])
+        column_list = ", ".join(columns)
+        return [
+            {
+                "type": "execute",
+                "stmt": {
+                    "sql": f"SELECT {column_list}, '{file_type}' as file_type FROM {table_name} "
+                           f"WHERE app_id = ? ORDER BY uploaded_at DESC",
+                    "args": args
+                }
+            }
+            for file_type, table_name in FILE_TABLES.items()
+        ]
     
-    async def get_files_by_app_id(self, app_id: str) -> List[Dict]:
-        """Get all files for a specific app_id from all file tables"""
-        query = """
-        SELECT id, app_id, filename, size, uploaded_at, 'json' as file_type 
-        FROM json_files WHERE app_id = ?
-        UNION ALL
-        SELECT id, app_id, filename, size, uploaded_at, 'lua' as file_type 
-        FROM lua_files WHERE app_id = ?
-        UNION ALL
-        SELECT id, app_id, filename, size, uploaded_at, 'manifest' as file_type 
-        FROM manifest_files WHERE app_id = ?
-        UNION ALL
-        SELECT id, app_id, filename, size, uploaded_at, 'vdf' as file_type 
-        FROM vdf_files WHERE app_id = ?
-        ORDER BY uploaded_at DESC
+    async def _select_from_file_tables(self, columns: tuple, app_id: str) -> List[List[Any]]:
+        """Select columns for app_id from every file table in one pipeline round trip.
+        
+        Each table is queried separately so SQLite can use its app_id index, and
+        the already-sorted row lists are merged newest-first on the client.
+        Rows carry a trailing file_type column.
         """
+        requests = self._file_table_requests(columns, app_id)
         
-        try:
-            result = await self._execute_query(query, [app_id, app_id, app_id, app_id])
-            
-            files = []
-            if "rows" in result:
-                for row in result["rows"]:
-                    files.append({
-                        "id": self._extract_value(row[0]),
-                        "app_id": self._extract_value(row[1]),
-                        "filename": self._extract_value(row[2]),
-                        "size": self._extract_value(row[3]),
-                        "uploaded_at": self._extract_value(row[4]),
-                        "file_type": self._extract_value(row[5])
-                    })
-            
-            return files
-            
-        except Exception as e:
-            print(f"Error getting files for app {app_id}: {e}")
-            return []
+        results = await self._pipeline(requests)
+        
+        self._check_results(results)
+        row_lists = [result["response"].get("result", {}).get("rows", []) for result in results]
+        
+        uploaded_at = columns.index("uploaded_at")
+        return list(heapq.merge(
+            *row_lists,
+            key=lambda row: _extract_value(row[uploaded_at]) or "",
+            reverse=True
+        ))
     
-    async def get_file_by_id(self, file_id: str, file_type: str) -> Optional[Dict]:
-        """Get a specific file by ID and type"""
-        table_map = {
-            'json': 'json_files',
-            'lua': 'lua_files', 
-            'manifest': 'manifest_files',
-            'vdf': 'vdf_files'
-        }
+    async def get_files_by_app_id(self, app_id: str, version: Optional[tuple] = None) -> List[FileRow]:
+        """Get all files for a specific app_id from all file tables.
         
-        if file_type not in table_map:
+        Pass the token from get_files_version as version to make it part of the
+        cache key, so a cached listing is never served for a changed app.
+        Failures raise rather than returning an empty listing, which callers
+        could otherwise serve (and cache) under a valid version.
+        """
+        # Always pass version positionally so the cache key matches invalidate_app
+        return await self._get_files_by_app_id(app_id, version)
+    
+    @alru_cache(maxsize=FILE_LIST_CACHE_SIZE, ttl=LOOKUP_CACHE_TTL_SECONDS)
+    async def _get_files_by_app_id(self, app_id: str, version: Optional[tuple]) -> List[FileRow]:
+        """Cached file listing; failures raise so they are never cached"""
+        rows = await self._select_from_file_tables(FILE_COLUMNS, app_id)
+        return _rows_to_file_rows(FILE_COLUMNS + ("file_type",), rows)
+    
+    def invalidate_app(self, app_id: str):
+        """Drop every cached read for app_id; call after writing its app or files"""
+        self.get_app_by_id.cache_invalidate(app_id)
+        # Versioned listings go stale on their own once the version token is
+        # re-read; only the unversioned entry needs dropping
+        self._get_files_by_app_id.cache_invalidate(app_id, None)
+        # File contents are cached by (file_id, file_type) with no app_id in the
+        # key; the cache is small and writes are rare, so drop all of it
+        self._get_file_by_id.cache_clear()
+        self._versions.pop("apps", None)
+        self._versions.pop(("files", app_id), None)
+        self._apps_snapshots.clear()
+    
+    async def get_file_by_id(self, file_id: str, file_type: str) -> Optional[FileRow]:
+        """Get a specific file by ID and type"""
+        if file_type not in FILE_TABLES:
             return None
-            
-        table_name = table_map[file_type]
-        query = f"SELECT id, app_id, filename, content, size, uploaded_at FROM {table_name} WHERE id = ?"
         
         try:
-            result = await self._execute_query(query, [file_id])
-            
-            if "rows" in result and len(result["rows"]) > 0:
-                row = result["rows"][0]
-                return {
-                    "id": self._extract_value(row[0]),
-                    "app_id": self._extract_value(row[1]),
-                    "filename": self._extract_value(row[2]),
-                    "content": self._extract_value(row[3]),
-                    "size": self._extract_value(row[4]),
-                    "uploaded_at": self._extract_value(row[5]),
-                    "file_type": file_type
-                }
+            return await self._get_file_by_id(file_id, file_type)
             
-            return None
-            
-        except Exception as e:
-            print(f"Error getting file {file_id} from {table_name}: {e}")
+        except Exception:
+            logger.exception("Error getting file %s from %s", file_id, FILE_TABLES[file_type])
             return None
     
-    async def get_all_files_content_by_app_id(self, app_id: str) -> List[Dict]:
-        """Get all files with content for a specific app_id (for ZIP download)"""
-        query = """
-        SELECT id, app_id, filename, content, size, uploaded_at, 'json' as file_type 
-        FROM json_files WHERE app_id = ?
-        UNION ALL
-        SELECT id, app_id, filename, content, size, uploaded_at, 'lua' as file_type 
-        FROM lua_files WHERE app_id = ?
-        UNION ALL
-        SELECT id, app_id, filename, content, size, uploaded_at, 'manifest' as file_type 
-        FROM manifest_files WHERE app_id = ?
-        UNION ALL
-        SELECT id, app_id, filename, content, size, uploaded_at, 'vdf' as file_type 
-        FROM vdf_files WHERE app_id = ?
-        ORDER BY uploaded_at DESC
+    @alru_cache(maxsize=FILE_CACHE_SIZE, ttl=LOOKUP_CACHE_TTL_SECONDS)
+    async def _get_file_by_id(self, file_id: str, file_type: str) -> Optional[FileRow]:
+        """Cached file lookup; failures raise so they are never cached"""
+        table_name = FILE_TABLES[file_type]
+        query = f"SELECT {', '.join(FILE_CONTENT_COLUMNS)} FROM {table_name} WHERE id = ?"
+        
+        result = await self._execute_query(query, [file_id])
+        
+        if "rows" in result and len(result["rows"]) > 0:
+            row = result["rows"][0]
+            return FileRow(**dict(zip(FILE_CONTENT_COLUMNS, map(_cell_value, row))), file_type=file_type)
+        
+        return None
+    
+    async def _stream_rows(self, requests: List[Dict[str, Any]]) -> AsyncIterator[List[Any]]:
+        """Yield result rows of a pipeline as they are parsed off the wire.
+        
+        The response body is never held in memory as a whole. Rows of all
+        statements come out in statement order; a failed statement raises once
+        the parser reaches it.
         """
+        # One-off stream: close it in the same pipeline instead of keeping a baton
+        requests = requests + [{"type": "close"}]
         
-        try:
-            result = await self._execute_query(query, [app_id, app_id, app_id, app_id])
-            
-            files = []
-            if "rows" in result:
-                for row in result["rows"]:
-                    files.append({
-                        "id": self._extract_value(row[0]),
-                        "app_id": self._extract_value(row[1]),
-                        "filename": self._extract_value(row[2]),
-                        "content": self._extract_value(row[3]),
-                        "size": self._extract_value(row[4]),
-                        "uploaded_at": self._extract_value(row[5]),
-                        "file_type": self._extract_value(row[6])
-                    })
-            
-            return files
-            
-        except Exception as e:
-            print(f"Error getting files content for app {app_id}: {e}")
-            return []
+        async with self._slot(self._stream_sem, self._stream_durations):
+            async with self._http.stream(
+                "POST", self.api_url, content=orjson.dumps({"baton": None, "requests": requests})
+            ) as response:
+                if response.status_code != 200:
+                    await response.aread()
+                    raise Exception(f"Database query failed: {response.status_code} - {response.text}")
+                
+                # Walk parser events rather than items so failed statements
+                # are noticed without buffering whole results
+                events = ijson.parse_async(
+                    _AsyncByteReader(response.aiter_bytes()), use_float=True
+                ).__aiter__()
+                async for prefix, event, value in events:
+                    if prefix == STREAM_ROW_PREFIX and event == "start_array":
+                        yield await _build_json_value(events, event, value)
+                    elif prefix == STREAM_ERROR_PREFIX and event == "start_map":
+                        error = await _build_json_value(events, event, value)
+                        raise Exception(f"Database query error: {error}")
+    
+    async def iter_files_content_by_app_id(self, app_id: str) -> AsyncIterator[FileRow]:
+        """Yield files with content for app_id as they are read from the database.
+        
+        Peak memory stays at roughly one file. Files come out grouped by file
+        table rather than globally newest-first.
+        """
+        requests = self._file_table_requests(FILE_CONTENT_COLUMNS, app_id)
+        async with contextlib.aclosing(self._stream_rows(requests)) as rows:
+            async for row in rows:
+                yield _rows_to_file_rows(FILE_CONTENT_COLUMNS + ("file_type",), [row])[0]
+    
+    async def iter_all_apps(self) -> AsyncIterator[Dict]:
+        """Yield every app, newest first, as it is read from the database"""
+        requests = [{
+            "type": "execute",
+            "stmt": {"sql": f"SELECT {', '.join(APP_COLUMNS)} FROM apps ORDER BY created_at DESC, app_id DESC"}
+        }]
+        async with contextlib.aclosing(self._stream_rows(requests)) as rows:
+            async for row in rows:
+                yield _rows_to_dicts(APP_COLUMNS, [row])[0]
 
     async def close(self):
         """Close database connection"""
-        print("Database connection closed")
\ No newline at end of file
+        if self._http is not None:
+            # Explicitly close any streams still held open on the server
+            while self._batons:
+                baton, base_url, _ = self._batons.pop()
+                url = _build_api_url(base_url) if base_url else self.api_url
+                try:
+                    await self._http.post(
+                        url,
+                        content=orjson.dumps({"baton": baton, "requests": [{"type": "close"}]})
+                    )
+                except httpx.HTTPError as e:
+                    logger.warning("Failed to close database stream: %s", e)
+            await self._http.aclose()
+            self._http = None
+        logger.info("Database connection closed")
\ No newline at end of file
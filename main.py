@@ -1,43 +1,94 @@
-from fastapi import FastAPI, HTTPException, Depends, Request
+from fastapi import FastAPI, HTTPException, Depends, Request, Response, Query, Path
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import StreamingResponse
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import ORJSONResponse, StreamingResponse
+from starlette.background import BackgroundTask
 from contextlib import asynccontextmanager
 import os
 import asyncio
-import httpx
+import hashlib
+import orjson
+import logging
+import queue
+from concurrent.futures import ThreadPoolExecutor
+from logging.handlers import QueueHandler, QueueListener
 import zipfile
-import io
+from zipstream import ZipStream
 from datetime import datetime
-from dotenv import load_dotenv
 from slowapi import Limiter, _rate_limit_exceeded_handler
 from slowapi.util import get_remote_address
 from slowapi.errors import RateLimitExceeded
+from config import get_settings
 from database import DatabaseManager
 from models import App, ApiResponse, AppFile
-from typing import List
+from typing import Annotated, List, Literal, Optional
+from pydantic import TypeAdapter
 
-# Load environment variables
-load_dotenv()
+logging.basicConfig(level=logging.INFO)
+# httpx logs every Turso request at INFO level
+logging.getLogger("httpx").setLevel(logging.WARNING)
+logger = logging.getLogger(__name__)
+
+# Threads for ZIP deflate; zlib releases the GIL while compressing, so threads
+# keep the event loop free without pickling file contents to a process pool
+zip_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="zip")
 
 # Global database manager instance
 db_manager = DatabaseManager()
 
-# Keep-alive task to prevent Render free tier sleep
+# Heartbeat interval: wake every minute so cancellation on shutdown is prompt,
+# but only query the database every 10 minutes
+KEEP_ALIVE_TICK_SECONDS = 60
+KEEP_ALIVE_EVERY_TICKS = 10
+
 async def keep_alive_task():
-    """Background task to ping the server every 10 minutes to prevent sleep"""
+    """Background heartbeat that periodically checks the database is reachable.
+    
+    Failures are only logged. At this interval it keeps neither a Hrana
+    stream (idle after BATON_MAX_IDLE_SECONDS) nor a pooled connection (idle
+    after 30s) warm; the first query after a quiet spell reconnects as usual.
+    
+    This replaces a loopback HTTP self-ping, which never passed through
+    Render's proxy and so never counted as inbound traffic anyway. To keep a
+    free-tier instance awake, point an external uptime monitor at /ping.
+    """
+    ticks = 0
     while True:
+        await asyncio.sleep(KEEP_ALIVE_TICK_SECONDS)
+        ticks += 1
+        if ticks % KEEP_ALIVE_EVERY_TICKS:
+            continue
         try:
-            await asyncio.sleep(600)  # Wait 10 minutes
-            async with httpx.AsyncClient() as client:
-                response = await client.get("http://localhost:8000/ping", timeout=10.0)
-                print(f"Keep-alive ping: {response.status_code} at {datetime.now()}")
+            await db_manager.test_connection()
+            logger.info("Keep-alive heartbeat at %s", datetime.now())
         except Exception as e:
-            print(f"Keep-alive ping failed: {e}")
-            # Continue the loop even if ping fails
+            logger.warning("Keep-alive heartbeat failed: %s", e)
+            # Continue the loop even if the heartbeat fails
+
+def start_queue_logging() -> QueueListener:
+    """Route all logging through a queue so handlers write on a background
+    thread instead of blocking the event loop.
+    
+    Done at startup rather than import time: `python main.py` imports this
+    module twice (as __main__ and as main), and only the copy serving the app
+    may own the root handlers.
+    """
+    root = logging.getLogger()
+    log_queue = queue.Queue(-1)
+    log_listener = QueueListener(log_queue, *root.handlers, respect_handler_level=True)
+    root.handlers = [QueueHandler(log_queue)]
+    log_listener.start()
+    return log_listener
+
+def stop_queue_logging(log_listener: QueueListener):
+    """Flush queued records and hand the original handlers back to the root logger"""
+    log_listener.stop()
+    logging.getLogger().handlers = list(log_listener.handlers)
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # Startup
+    log_listener = start_queue_logging()
     await db_manager.initialize()
     # Start keep-alive task
     keep_alive_task_handle = asyncio.create_task(keep_alive_task())
@@ -45,6 +96,8 @@ async def lifespan(app: FastAPI):
     # Shutdown
     keep_alive_task_handle.cancel()
     await db_manager.close()
+    zip_executor.shutdown(wait=False)
+    stop_queue_logging(log_listener)
 
 # Rate limiter setup
 limiter = Limiter(key_func=get_remote_address)
@@ -52,7 +105,8 @@ app = FastAPI(
     title="Steam External Backend API",
     description="FastAPI backend for Steam apps data connected to Turso database",
     version="1.0.0",
-    lifespan=lifespan
+    lifespan=lifespan,
+    default_response_class=ORJSONResponse
 )
 app.state.limiter = limiter
 app.add_exception_handler(RateLimitExceeded, _rate_limit_exceeded_handler)
@@ -60,14 +114,51 @@ app.add_exception_handler(RateLimitExceeded, _rate_limit_exceeded_handler)
 # FastAPI app already created above with rate limiter
 
 # Add CORS middleware
+settings = get_settings()
 app.add_middleware(
     CORSMiddleware,
-    allow_origins=["*"],  # Configure this properly for production
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
+    allow_origins=settings.cors_origins,
+    allow_credentials=settings.cors_allow_credentials,
+    allow_methods=settings.cors_allow_methods,
+    allow_headers=settings.cors_allow_headers,
 )
 
+# Compress JSON responses for clients that accept gzip; level 1 trades a little
+# ratio for much less CPU, and small bodies like /ping are left alone
+app.add_middleware(GZipMiddleware, minimum_size=500, compresslevel=1)
+
+# Conditional GET support: list endpoints derive an ETag from a cheap version
+# query and answer If-None-Match with 304 before running the full query
+
+def make_etag(*parts) -> str:
+    """Build a quoted strong ETag from the given version parts"""
+    digest = hashlib.blake2b(
+        ":".join(str(part) for part in parts).encode(), digest_size=16
+    ).hexdigest()
+    return f'"{digest}"'
+
+def is_not_modified(request: Request, etag: str) -> bool:
+    """Check whether the client's If-None-Match already matches etag"""
+    if_none_match = request.headers.get("if-none-match")
+    if not if_none_match:
+        return False
+    candidates = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+    return etag in candidates or "*" in candidates
+
+# The app list changes whenever apps are added, so clients must revalidate it;
+# single-app and per-app file lookups are near-immutable and may be shared by
+# browsers and CDNs for a few minutes
+REVALIDATE_CACHE_CONTROL = "private, must-revalidate"
+PUBLIC_CACHE_CONTROL = "public, max-age=300, stale-while-revalidate=3600"
+
+def cache_headers(etag: str, cache_control: str) -> dict:
+    """Validator and caching headers for a cacheable GET response"""
+    return {"ETag": etag, "Cache-Control": cache_control, "Vary": "Accept-Encoding"}
+
+def not_modified_response(etag: str, cache_control: str = REVALIDATE_CACHE_CONTROL) -> Response:
+    """Empty 304 response carrying the current validators"""
+    return Response(status_code=304, headers=cache_headers(etag, cache_control))
+
 @app.get("/", response_model=ApiResponse)
 async def root():
     """Root endpoint"""
@@ -94,6 +185,17 @@ async def health_check():
             detail=f"Database connection failed: {str(e)}"
         )
 
+@app.get("/debug/pool", response_model=ApiResponse)
+async def debug_pool():
+    """Database connection usage and latency percentiles (debug mode only)"""
+    if not get_settings().debug:
+        raise HTTPException(status_code=404, detail="Not Found")
+    return ApiResponse(
+        success=True,
+        message="Database pool stats",
+        data=db_manager.pool_stats()
+    )
+
 @app.get("/ping")
 async def ping():
     """Lightweight ping endpoint to keep server alive"""
@@ -103,15 +205,53 @@ async def ping():
         "message": "Server is active"
     }
 
+# Separates created_at and app_id in /apps pagination cursors
+APPS_CURSOR_SEPARATOR = "|"
+
+def encode_apps_cursor(app: dict) -> str:
+    """Build the /apps cursor that resumes right after app"""
+    return f"{app['created_at']}{APPS_CURSOR_SEPARATOR}{app['app_id']}"
+
+def decode_apps_cursor(after: str) -> tuple:
+    """Split an /apps cursor into (created_at, app_id); ValueError if malformed"""
+    # app_ids are numeric, so the last separator always splits them correctly
+    created_at, separator, app_id = after.rpartition(APPS_CURSOR_SEPARATOR)
+    if not separator or not created_at or not app_id.isdigit():
+        raise ValueError(f"Invalid apps cursor: {after!r}")
+    return created_at, app_id
+
 @app.get("/apps", response_model=ApiResponse)
-async def get_apps():
-    """Get all apps"""
+async def get_apps(
+    request: Request,
+    limit: int = Query(100, ge=1, le=1000, description="Maximum number of apps to return"),
+    after: Optional[str] = Query(None, description="Cursor from the previous page's next_after")
+):
+    """Get apps, newest first, one page at a time"""
+    cursor = None
+    if after is not None:
+        try:
+            cursor = decode_apps_cursor(after)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid after cursor")
+    
     try:
-        apps = await db_manager.get_all_apps()
-        return ApiResponse(
-            success=True,
-            message="Apps retrieved successfully",
-            data={"apps": apps}
+        version = await db_manager.get_apps_version()
+        etag = make_etag(*version, limit, after)
+        if is_not_modified(request, etag):
+            return not_modified_response(etag)
+        
+        apps = await db_manager.get_all_apps(limit=limit, after=cursor, version=version)
+        next_after = encode_apps_cursor(apps[-1]) if len(apps) == limit else None
+        
+        # Hot endpoint: hand the rows straight to orjson instead of letting
+        # FastAPI validate and jsonable_encode every app through ApiResponse
+        return ORJSONResponse(
+            {
+                "success": True,
+                "message": "Apps retrieved successfully",
+                "data": {"apps": apps, "next_after": next_after}
+            },
+            headers=cache_headers(etag, REVALIDATE_CACHE_CONTROL)
         )
     except Exception as e:
         raise HTTPException(
@@ -119,8 +259,26 @@ async def get_apps():
             detail=f"Failed to retrieve apps: {str(e)}"
         )
 
+@app.get("/apps.ndjson")
+@limiter.limit("10/minute")
+async def stream_apps(request: Request):
+    """Stream every app as newline-delimited JSON, newest first.
+    
+    Rows are sent as they are read from the database, so this suits full
+    exports that would be too large for a single /apps page.
+    """
+    async def generate():
+        apps = db_manager.iter_all_apps()
+        try:
+            async for app in apps:
+                yield orjson.dumps(app) + b"\n"
+        finally:
+            await apps.aclose()
+    
+    return StreamingResponse(generate(), media_type="application/x-ndjson")
+
 @app.get("/apps/{app_id}", response_model=ApiResponse)
-async def get_app(app_id: str):
+async def get_app(request: Request, response: Response, app_id: str):
     """Get a specific app by app_id"""
     try:
         app = await db_manager.get_app_by_id(app_id)
@@ -129,6 +287,12 @@ async def get_app(app_id: str):
                 status_code=404,
                 detail="App not found"
             )
+        
+        etag = make_etag(app["app_id"], app["updated_at"])
+        if is_not_modified(request, etag):
+            return not_modified_response(etag, PUBLIC_CACHE_CONTROL)
+        
+        response.headers.update(cache_headers(etag, PUBLIC_CACHE_CONTROL))
         return ApiResponse(
             success=True,
             message="App retrieved successfully",
@@ -146,60 +310,64 @@ async def get_app(app_id: str):
 # These endpoints preserve binary integrity by avoiding unnecessary base64 conversions
 # and returning files in their original format to prevent size inflation
 
+# Path/query parameter types, validated by FastAPI before the handler runs
+NumericAppId = Annotated[str, Path(pattern=r"^\d+$", description="Numeric Steam app ID")]
+FileType = Literal['json', 'lua', 'manifest', 'vdf']
+
+# Batch validator/serializer for file listings, built once at import
+app_file_list = TypeAdapter(List[AppFile])
+
+FILE_EXTENSIONS = {
+    'json': '.json',
+    'lua': '.lua',
+    'manifest': '.manifest',
+    'vdf': '.vdf'
+}
+
+MIME_TYPES = {
+    'json': 'application/json',
+    'lua': 'text/plain',
+    'manifest': 'text/plain',
+    'vdf': 'text/plain'
+}
+
 def get_file_extension(file_type: str) -> str:
     """Get file extension based on file type"""
-    extensions = {
-        'json': '.json',
-        'lua': '.lua', 
-        'manifest': '.manifest',
-        'vdf': '.vdf'
-    }
-    return extensions.get(file_type, '.txt')
+    return FILE_EXTENSIONS.get(file_type, '.txt')
 
 def get_mime_type(file_type: str) -> str:
     """Get MIME type based on file type"""
-    mime_types = {
-        'json': 'application/json',
-        'lua': 'text/plain',
-        'manifest': 'text/plain', 
-        'vdf': 'text/plain'
-    }
-    return mime_types.get(file_type, 'text/plain')
+    return MIME_TYPES.get(file_type, 'text/plain')
 
 @app.get("/files/{app_id}", response_model=ApiResponse)
-async def list_files(app_id: str):
+async def list_files(request: Request, response: Response, app_id: NumericAppId):
     """List all files for a specific app_id"""
     try:
-        # Validate app_id is numeric
-        if not app_id.isdigit():
-            raise HTTPException(
-                status_code=400,
-                detail="Invalid app_id format. Must be numeric."
-            )
+        version = await db_manager.get_files_version(app_id)
+        etag = make_etag(app_id, *version)
+        if is_not_modified(request, etag):
+            return not_modified_response(etag, PUBLIC_CACHE_CONTROL)
         
-        files = await db_manager.get_files_by_app_id(app_id)
+        files = await db_manager.get_files_by_app_id(app_id, version)
         
-        # Convert to AppFile models
-        app_files = []
-        for file_data in files:
-            app_files.append(AppFile(
-                id=file_data['id'],
-                app_id=file_data['app_id'],
-                filename=file_data['filename'],
-                file_type=file_data['file_type'],
-                size=file_data['size'],
-                uploaded_at=file_data['uploaded_at']
-            ))
+        # Validate and convert all rows to AppFile-shaped dicts in one pass
+        app_files = app_file_list.dump_python(
+            app_file_list.validate_python(files, from_attributes=True),
+            mode='json'
+        )
         
+        response.headers.update(cache_headers(etag, PUBLIC_CACHE_CONTROL))
         return ApiResponse(
             success=True,
             message=f"Found {len(app_files)} files for app {app_id}",
-            data={"files": [file.dict() for file in app_files]}
+            data={"files": app_files}
         )
         
     except HTTPException:
         raise
     except Exception as e:
+        # Errors go out without the ETag/cache headers so nothing caches them
+        logger.exception("Error listing files for app %s", app_id)
         raise HTTPException(
             status_code=500,
             detail=f"Internal server error: {str(e)}"
@@ -207,17 +375,9 @@ async def list_files(app_id: str):
 
 @app.get("/download/file/{file_id}")
 @limiter.limit("1/2minutes")
-async def download_file(request: Request, file_id: str, file_type: str):
+async def download_file(request: Request, file_id: str, file_type: FileType):
     """Download a specific file by ID and type"""
     try:
-        # Validate file_type
-        valid_types = ['json', 'lua', 'manifest', 'vdf']
-        if file_type not in valid_types:
-            raise HTTPException(
-                status_code=400,
-                detail=f"Invalid file_type. Must be one of: {', '.join(valid_types)}"
-            )
-        
         file_data = await db_manager.get_file_by_id(file_id, file_type)
         
         if not file_data:
@@ -228,13 +388,13 @@ async def download_file(request: Request, file_id: str, file_type: str):
         
         # Get file extension and ensure filename has it
         extension = get_file_extension(file_type)
-        filename = file_data['filename']
+        filename = file_data.filename
         if not filename.endswith(extension):
             filename += extension
         
         # Return original file content without any encoding conversion
         # This preserves the exact binary data and file size
-        original_content = file_data['content']
+        original_content = file_data.content
         
         # Convert to bytes only if it's a string (for text files)
         if isinstance(original_content, str):
@@ -243,19 +403,17 @@ async def download_file(request: Request, file_id: str, file_type: str):
             # If it's already bytes, use as-is
             content_bytes = original_content
         
-        # Create streaming response with original binary data
-        def generate():
-            yield content_bytes
-        
         headers = {
             'Content-Disposition': f'attachment; filename="{filename}"',
-            'Content-Length': str(len(content_bytes)),
             'Content-Type': 'application/octet-stream',  # Use binary type to preserve data
             'Cache-Control': 'no-cache'
         }
         
-        return StreamingResponse(
-            generate(),
+        # The content is already in memory, so hand it over in one body and
+        # let the server's transport do the chunking; a streaming iterator
+        # would only add per-chunk copies and threadpool hops
+        return Response(
+            content=content_bytes,
             media_type='application/octet-stream',  # Binary download to preserve integrity
             headers=headers
         )
@@ -270,70 +428,80 @@ async def download_file(request: Request, file_id: str, file_type: str):
 
 @app.get("/download/app/{app_id}")
 @limiter.limit("1/2minutes")
-async def download_app_files(request: Request, app_id: str):
+async def download_app_files(request: Request, app_id: NumericAppId):
     """Download all files for an app as a ZIP archive"""
     try:
-        # Validate app_id is numeric
-        if not app_id.isdigit():
-            raise HTTPException(
-                status_code=400,
-                detail="Invalid app_id format. Must be numeric."
-            )
-        
-        files = await db_manager.get_all_files_content_by_app_id(app_id)
+        files = db_manager.iter_files_content_by_app_id(app_id)
+        first_file = await anext(files, None)
         
-        if not files:
+        if first_file is None:
             raise HTTPException(
                 status_code=404,
                 detail=f"No files found for app {app_id}"
             )
         
-        # Create ZIP file in memory
-        zip_buffer = io.BytesIO()
-        
-        with zipfile.ZipFile(zip_buffer, 'w', zipfile.ZIP_DEFLATED) as zip_file:
-            for file_data in files:
-                # Get file extension and ensure filename has it
-                extension = get_file_extension(file_data['file_type'])
-                filename = file_data['filename']
-                if not filename.endswith(extension):
-                    filename += extension
+        # Stream the ZIP as it is built: each file is deflated and sent as soon
+        # as it is read from the database, so neither the query result nor the
+        # archive is ever held in memory as a whole
+        async def generate():
+            # Level 1 is several times faster than the default and JSON/Lua/VDF
+            # text still compresses well at it
+            zip_stream = ZipStream(compress_type=zipfile.ZIP_DEFLATED, compress_level=1)
+            try:
+                file_data = first_file
+                while file_data is not None:
+                    # Get file extension and ensure filename has it
+                    extension = get_file_extension(file_data.file_type)
+                    filename = file_data.filename
+                    if not filename.endswith(extension):
+                        filename += extension
+                    
+                    # Preserve original file content without conversion
+                    original_content = file_data.content
+                    
+                    # Handle content based on its type to preserve binary integrity
+                    if isinstance(original_content, str):
+                        # For text files, encode to bytes
+                        file_bytes = original_content.encode('utf-8')
+                    else:
+                        # For binary files, use as-is
+                        file_bytes = original_content
+                    
+                    # Add file to ZIP with original binary data
+                    zip_stream.add(file_bytes, filename)
+                    # Deflate is CPU-bound; run it on the ZIP pool so large
+                    # archives don't stall every other request on the loop
+                    chunks = await asyncio.get_running_loop().run_in_executor(
+                        zip_executor, list, zip_stream.all_files()
+                    )
+                    for chunk in chunks:
+                        yield chunk
+                    
+                    file_data = await anext(files, None)
                 
-                # Preserve original file content without conversion
-                original_content = file_data['content']
-                
-                # Handle content based on its type to preserve binary integrity
-                if isinstance(original_content, str):
-                    # For text files, encode to bytes
-                    file_bytes = original_content.encode('utf-8')
-                else:
-                    # For binary files, use as-is
-                    file_bytes = original_content
-                
-                # Add file to ZIP with original binary data
-                zip_file.writestr(filename, file_bytes)
-        
-        zip_buffer.seek(0)
-        
-        # Create streaming response with binary integrity preservation
-        def generate():
-            while True:
-                chunk = zip_buffer.read(8192)
-                if not chunk:
-                    break
-                yield chunk
+                for chunk in zip_stream.footer():
+                    yield chunk
+            finally:
+                await files.aclose()
         
         headers = {
             'Content-Disposition': f'attachment; filename="app_{app_id}_files.zip"',
-            'Content-Length': str(zip_buffer.getbuffer().nbytes),
             'Content-Type': 'application/zip',
+            'Content-Encoding': 'identity',  # Already deflated, skip gzip middleware
             'Cache-Control': 'no-cache'
         }
         
+        # generate() closes files itself once started; the background task
+        # also releases the database stream if the body is never iterated.
+        # It must be a coroutine function or starlette runs it in a thread
+        async def close_files():
+            await files.aclose()
+        
         return StreamingResponse(
             generate(),
             media_type='application/zip',
-            headers=headers
+            headers=headers,
+            background=BackgroundTask(close_files)
         )
         
     except HTTPException:
@@ -346,4 +514,17 @@ async def download_app_files(request: Request, app_id: str):
 
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
+    # uvloop and httptools come with uvicorn[standard]. Worker count defaults
+    # to $WEB_CONCURRENCY, or 1 when unset. Multiple workers need the import
+    # string so each imports the app (and its DatabaseManager) after forking;
+    # a single worker serves this module's app directly instead of importing
+    # a second copy of it as `main`
+    workers = int(os.getenv("WEB_CONCURRENCY", "1"))
+    uvicorn.run(
+        "main:app" if workers > 1 else app,
+        host=settings.host,
+        port=settings.port,
+        loop="uvloop",
+        http="httptools",
+        workers=workers
+    )
\ No newline at end of file
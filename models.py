@@ -1,7 +1,23 @@
-from pydantic import BaseModel, Field
-from typing import Optional, Any, List
+from pydantic import BaseModel, ConfigDict, Field
+from dataclasses import dataclass
+from typing import Optional, Any, List, Union
 from datetime import datetime
 
+@dataclass(slots=True)
+class FileRow:
+    """File row as returned by DatabaseManager.
+    
+    Slotted to keep large file listings and ZIP downloads light; values are as
+    Turso returns them, so integer columns may arrive as strings.
+    """
+    id: str
+    app_id: str
+    filename: str
+    size: Union[int, str]
+    uploaded_at: str
+    file_type: str
+    content: Optional[Union[str, bytes]] = None
+
 class AppFile(BaseModel):
     """App file model for listing files"""
     id: str = Field(..., description="File ID (UUID)")
@@ -11,9 +27,9 @@ class AppFile(BaseModel):
     size: int = Field(..., description="File size in bytes")
     uploaded_at: str = Field(..., description="Upload timestamp")
     
-    class Config:
-        from_attributes = True
-        json_schema_extra = {
+    model_config = ConfigDict(
+        from_attributes=True,
+        json_schema_extra={
             "example": {
                 "id": "5d1fcc24-ce86-4600-9494-81c10fa4d6bf",
                 "app_id": "1245623",
@@ -23,6 +39,7 @@ class AppFile(BaseModel):
                 "uploaded_at": "2025-08-02T17:13:33.110Z"
             }
         }
+    )
 
 class FileInfo(BaseModel):
     """File information model"""
@@ -31,8 +48,8 @@ class FileInfo(BaseModel):
     content_type: str = Field(..., description="MIME type of the file")
     upload_date: datetime = Field(..., description="Date when file was uploaded")
     
-    class Config:
-        json_schema_extra = {
+    model_config = ConfigDict(
+        json_schema_extra={
             "example": {
                 "filename": "document.pdf",
                 "size": 1024000,
@@ -40,6 +57,7 @@ class FileInfo(BaseModel):
                 "upload_date": "2025-08-02T17:13:33.110Z"
             }
         }
+    )
 
 class FileUploadResponse(BaseModel):
     """File upload response model"""
@@ -48,8 +66,8 @@ class FileUploadResponse(BaseModel):
     file_info: Optional[FileInfo] = Field(None, description="Uploaded file information")
     file_id: Optional[str] = Field(None, description="Unique identifier for the uploaded file")
     
-    class Config:
-        json_schema_extra = {
+    model_config = ConfigDict(
+        json_schema_extra={
             "example": {
                 "success": True,
                 "message": "File uploaded successfully",
@@ -62,6 +80,7 @@ class FileUploadResponse(BaseModel):
                 "file_id": "file_123456"
             }
         }
+    )
 
 class App(BaseModel):
     """App model"""
@@ -71,9 +90,9 @@ class App(BaseModel):
     created_at: str
     updated_at: str
     
-    class Config:
-        from_attributes = True
-        json_schema_extra = {
+    model_config = ConfigDict(
+        from_attributes=True,
+        json_schema_extra={
             "example": {
                 "app_id": "1245623",
                 "name": "ELDEN RING",
@@ -82,6 +101,7 @@ class App(BaseModel):
                 "updated_at": "2025-08-02T17:13:37.782Z"
             }
         }
+    )
 
 class ApiResponse(BaseModel):
     """Standard API response model"""
@@ -89,14 +109,15 @@ class ApiResponse(BaseModel):
     message: str = Field(..., description="Response message")
     data: Optional[Any] = Field(None, description="Response data")
     
-    class Config:
-        json_schema_extra = {
+    model_config = ConfigDict(
+        json_schema_extra={
             "example": {
                 "success": True,
                 "message": "Operation completed successfully",
                 "data": {"key": "value"}
             }
         }
+    )
 
 class ErrorResponse(BaseModel):
     """Error response model"""
@@ -105,12 +126,13 @@ class ErrorResponse(BaseModel):
     error_code: Optional[str] = Field(None, description="Error code")
     details: Optional[Any] = Field(None, description="Additional error details")
     
-    class Config:
-        json_schema_extra = {
+    model_config = ConfigDict(
+        json_schema_extra={
             "example": {
                 "success": False,
                 "message": "An error occurred",
                 "error_code": "VALIDATION_ERROR",
                 "details": {"field": "username", "issue": "already exists"}
             }
-        }
\ No newline at end of file
+        }
+    )
\ No newline at end of file
@@ -0,0 +1,27 @@
+import asyncio
+import os
+
+import httpx
+import pytest
+
+# Settings require Turso credentials; tests never reach a real database
+os.environ.setdefault("TURSO_DATABASE_URL", "libsql://test.turso.io")
+os.environ.setdefault("TURSO_AUTH_TOKEN", "test-token")
+
+from database import DatabaseManager
+
+
+@pytest.fixture
+def make_db():
+    """Build a DatabaseManager whose HTTP client is answered by handler"""
+    def build(handler) -> DatabaseManager:
+        db = DatabaseManager()
+        db._http = httpx.AsyncClient(
+            transport=httpx.MockTransport(handler),
+            headers=db._default_headers
+        )
+        db._sem = asyncio.Semaphore(db.max_concurrency)
+        db._stream_sem = asyncio.Semaphore(db.max_streams)
+        return db
+    
+    return build
@@ -0,0 +1,82 @@
+import asyncio
+
+import httpx
+import orjson
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+from database import APP_COLUMNS
+
+
+def _ok(rows):
+    return {"type": "ok", "response": {"type": "execute", "result": {"rows": rows}}}
+
+
+def _app_row(app_id, created_at):
+    values = (app_id, created_at, created_at, f"App {app_id}", "game")
+    return [{"type": "text", "value": value} for value in values]
+
+
+def test_cursor_round_trip():
+    app = {"app_id": "730", "created_at": "2025-01-01 12:00:00"}
+    
+    assert main.decode_apps_cursor(main.encode_apps_cursor(app)) == ("2025-01-01 12:00:00", "730")
+
+
+@pytest.mark.parametrize("after", ["", "2025-01-01", "|730", "2025-01-01|", "2025-01-01|abc"])
+def test_decode_rejects_malformed_cursor(after):
+    with pytest.raises(ValueError):
+        main.decode_apps_cursor(after)
+
+
+def test_apps_rejects_invalid_cursor():
+    # The cursor is checked before any database access, so no lifespan is needed
+    response = TestClient(main.app).get("/apps", params={"after": "not-a-cursor"})
+    
+    assert response.status_code == 400
+    assert "etag" not in response.headers
+
+
+def test_get_all_apps_pages_on_created_at_and_app_id(make_db):
+    payloads = []
+    
+    def handler(request):
+        payloads.append(orjson.loads(request.content))
+        return httpx.Response(200, content=orjson.dumps({"results": [_ok([_app_row("20", "2025-01-01")])]}))
+    
+    async def run():
+        db = make_db(handler)
+        apps = await db.get_all_apps(limit=1, after=("2025-01-01", "30"))
+        await db._http.aclose()
+        return apps
+    
+    apps = asyncio.run(run())
+    
+    stmt = payloads[0]["requests"][0]["stmt"]
+    assert "(created_at, app_id) < (?, ?)" in stmt["sql"]
+    assert "ORDER BY created_at DESC, app_id DESC" in stmt["sql"]
+    assert [arg["value"] for arg in stmt["args"]] == ["2025-01-01", "30", "1"]
+    assert list(apps[0]) == list(APP_COLUMNS)
+    assert main.encode_apps_cursor(apps[0]) == "2025-01-01|20"
+
+
+def test_concurrent_page_requests_share_one_query(make_db):
+    calls = []
+    
+    async def handler(request):
+        calls.append(request)
+        await asyncio.sleep(0.01)
+        return httpx.Response(200, content=orjson.dumps({"results": [_ok([_app_row("10", "2025-01-02")])]}))
+    
+    async def run():
+        db = make_db(handler)
+        pages = await asyncio.gather(*(db.get_all_apps(limit=1, version=("v", 1)) for _ in range(5)))
+        await db._http.aclose()
+        return pages, db
+    
+    pages, db = asyncio.run(run())
+    
+    assert len(calls) == 1
+    assert all(page == pages[0] for page in pages)
+    assert not db._apps_fetches
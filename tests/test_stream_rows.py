@@ -0,0 +1,80 @@
+import asyncio
+
+import httpx
+import orjson
+import pytest
+
+
+def _ok(rows):
+    return {"type": "ok", "response": {"type": "execute", "result": {"rows": rows}}}
+
+
+def _chunked_handler(results, chunk_size=7):
+    """Answer every request with results, split into small body chunks"""
+    body = orjson.dumps({"baton": None, "base_url": None, "results": results})
+    
+    async def chunks():
+        for start in range(0, len(body), chunk_size):
+            yield body[start:start + chunk_size]
+    
+    def handler(request):
+        return httpx.Response(200, content=chunks())
+    
+    return handler
+
+
+def _collect(db, rows_out):
+    async def run():
+        try:
+            async for row in db._stream_rows([{"type": "execute", "stmt": {"sql": "SELECT 1"}}]):
+                rows_out.append(row)
+        finally:
+            await db._http.aclose()
+    
+    asyncio.run(run())
+
+
+def test_stream_rows_yields_rows_of_every_statement_in_order(make_db):
+    db = make_db(_chunked_handler([
+        _ok([[{"type": "text", "value": "a"}, {"type": "float", "value": 1.5}]]),
+        _ok([[{"type": "text", "value": "b"}, {"type": "null"}]]),
+        {"type": "ok", "response": {"type": "close"}}
+    ]))
+    rows = []
+    
+    _collect(db, rows)
+    
+    assert rows == [
+        [{"type": "text", "value": "a"}, {"type": "float", "value": 1.5}],
+        [{"type": "text", "value": "b"}, {"type": "null"}]
+    ]
+    assert type(rows[0][1]["value"]) is float
+    assert db._stream_sem._value == db.max_streams
+    assert db._in_flight == 0
+    assert len(db._stream_durations) == 1
+
+
+def test_stream_rows_raises_on_failed_statement(make_db):
+    db = make_db(_chunked_handler([
+        _ok([[{"type": "text", "value": "a"}]]),
+        {"type": "error", "error": {"message": "no such table: missing", "code": "SQLITE_ERROR"}},
+        {"type": "ok", "response": {"type": "close"}}
+    ]))
+    rows = []
+    
+    with pytest.raises(Exception, match="no such table: missing"):
+        _collect(db, rows)
+    
+    # Rows before the failure were already streamed out
+    assert rows == [[{"type": "text", "value": "a"}]]
+    assert db._stream_sem._value == db.max_streams
+    assert db._in_flight == 0
+
+
+def test_stream_rows_raises_on_http_error(make_db):
+    db = make_db(lambda request: httpx.Response(500, text="boom"))
+    
+    with pytest.raises(Exception, match="500 - boom"):
+        _collect(db, [])
+    
+    assert db._stream_sem._value == db.max_streams